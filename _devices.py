@@ -63,6 +63,8 @@ class Wemo_Device(object):
                     _("module::wemo::ui::debug::%s" % wconst.WEMO_SERIAL_NUMBER, wconst.WEMO_SERIAL_NUMBER): self.wemo_device.endpoint.serialnumber,
                 }
             }
+            for name, value in self.wemo_device.event_details().items():
+                debug_data[wconst.PLATFORM_WEMO]['data'][_("module::wemo::ui::debug::%s" % name, name)] = value
         else:
             debug_data[wconst.PLATFORM_WEMO] = {
                 'title': _("module::wemo::ui::debug_header", "Wemo device details"),
@@ -129,6 +131,8 @@ class Wemo_binary_sensor(Wemo_Device, Binary_Sensor):
             FEATURE_SEND_UPDATES: True,
             }
         )
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_EDGE] = True
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_EDGE_AT] = True
 
 
 class Wemo_Switch(Wemo_Device, Switch):
@@ -142,3 +146,8 @@ class Wemo_Switch(Wemo_Device, Switch):
             FEATURE_SEND_UPDATES: True,
             }
         )
+        # Maker relay and sensor input.
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_RELAY_STATE] = True
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_SENSOR_STATE] = True
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_SENSOR_EDGE] = True
+        self.MACHINE_STATUS_EXTRA_FIELDS[wconst.STATUS_EXTRA_SENSOR_EDGE_AT] = True
@@ -9,3 +9,31 @@ WEMO_MODEL = "model"
 WEMO_MODEL_NAME = "model_name"
 WEMO_NAME = "name"
 WEMO_SERIAL_NUMBER = "serialnumber"
+
+# Seconds between discovery scans, randomized by the jitter percent.
+DISCOVERY_INTERVAL = 3600
+DISCOVERY_INTERVAL_JITTER = .20
+
+# How long a device can be missing from discovery scans before it's evicted, in seconds. Must be
+# longer than the longest scan interval.
+DEFAULT_VANISHED_TTL = 86400
+MINIMUM_VANISHED_TTL = DISCOVERY_INTERVAL * (1 + DISCOVERY_INTERVAL_JITTER)
+MODULE_VARIABLE_VANISHED_TTL = "vanished_ttl"
+
+# Event types sent by pywemo subscriptions.
+EVENT_BINARY_STATE = "BinaryState"
+EVENT_ATTRIBUTE_LIST = "attributeList"
+
+# Edges reported by binary sensors.
+EDGE_RISING = "rising"
+EDGE_FALLING = "falling"
+
+# Status extra sent by binary sensors with each update.
+STATUS_EXTRA_EDGE = "edge"
+STATUS_EXTRA_EDGE_AT = "edge_at"
+
+# Status extra sent by the maker, the sensor input is 1 when triggered.
+STATUS_EXTRA_SENSOR_STATE = "sensor_state"
+STATUS_EXTRA_RELAY_STATE = "relay_state"
+STATUS_EXTRA_SENSOR_EDGE = "sensor_edge"
+STATUS_EXTRA_SENSOR_EDGE_AT = "sensor_edge_at"
@@ -0,0 +1,190 @@
+"""
+Loads the wemo module for testing. The Yombo gateway isn't installable from PyPI, so the few
+yombo names this module imports are provided here. pywemo and twisted are the real packages.
+"""
+import functools
+import importlib
+import os
+import sys
+import threading
+import types
+
+import pytest
+import pywemo
+from twisted.internet import defer, task
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "wemo_module"
+
+
+class FakeLogger(object):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeYomboModule(object):
+    pass
+
+
+def _add_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def _install_yombo():
+    for name in ("yombo", "yombo.constants", "yombo.core", "yombo.lib", "yombo.lib.webinterface"):
+        _add_module(name)
+    _add_module("yombo.constants.commands", COMMAND_ON="on", COMMAND_OFF="off", COMMAND_TOGGLE="toggle",
+                COMMAND_COMPONENT_COMMAND="command", COMMAND_COMPONENT_DEVICE="device",
+                COMMAND_COMPONENT_REQUEST_ID="request_id", COMMAND_COMPONENT_INPUTS="inputs")
+    _add_module("yombo.constants.features", FEATURE_BRIGHTNESS="brightness", FEATURE_PERCENT="percent",
+                FEATURE_NUMBER_OF_STEPS="number_of_steps")
+    _add_module("yombo.constants.inputs", INPUT_BRIGHTNESS="brightness", INPUT_PERCENT="percent")
+    _add_module("yombo.constants.platforms", PLATFORM_LIGHT="light", PLATFORM_BINARY_SENSOR="binary_sensor",
+                PLATFORM_SWITCH="switch")
+    _add_module("yombo.constants.status_extra", STATUS_EXTRA_BRIGHTNESS="brightness")
+    _add_module("yombo.core.log", get_logger=lambda name: FakeLogger())
+    _add_module("yombo.core.module", YomboModule=FakeYomboModule)
+    _add_module("yombo.utils", random_int=lambda value, percent: value)
+    _add_module("yombo.lib.webinterface.auth", require_auth=lambda *args, **kwargs: (lambda func: func))
+
+
+_install_yombo()
+
+
+def load_package():
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(PACKAGE, os.path.join(ROOT, "__init__.py"),
+                                                      submodule_search_locations=[ROOT])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = module
+        spec.loader.exec_module(module)
+    return sys.modules[PACKAGE]
+
+
+class FakeEndpoint(object):
+    """A pywemo device as seen by the module, without any network access."""
+    def __init__(self, serialnumber, model_name="Socket", host="10.0.0.2", port=49153, state=0):
+        self.serialnumber = serialnumber
+        self.model_name = model_name
+        self.host = host
+        self.port = port
+        self.state = state
+        self.basicevent = types.SimpleNamespace(eventSubURL="http://%s:%s/upnp/event/basicevent1" % (host, port))
+
+    def get_state(self):
+        return self.state
+
+
+class FakeYomboDevice(object):
+    """Records status updates. Delayed updates are scheduled on the given clock."""
+    def __init__(self, clock, label="fake device"):
+        self.clock = clock
+        self.full_label = label
+        self.FEATURES = {}
+        self.wemo_device = None
+        self.statuses = []
+        self.delayed_calls = 0
+
+    def set_status(self, **kwargs):
+        self.statuses.append(kwargs)
+
+    def set_status_delayed(self, delay=None, **kwargs):
+        self.delayed_calls += 1
+        self.clock.callLater(delay, functools.partial(self.set_status, **kwargs))
+
+
+class FakeReactor(task.Clock):
+    """
+    A reactor clock that queues callFromThread calls, recording the thread they were handed
+    off from. Queued calls run when the clock is advanced.
+    """
+    def __init__(self):
+        task.Clock.__init__(self)
+        self.handoffs = []
+
+    def callFromThread(self, func, *args, **kwargs):
+        self.handoffs.append(threading.current_thread().name)
+        self.callLater(0, functools.partial(func, *args, **kwargs))
+
+    def flush(self):
+        """Run everything scheduled, advancing the clock as needed."""
+        self.advance(0)
+        while self.getDelayedCalls():
+            self.advance(min(call.getTime() for call in self.getDelayedCalls()) - self.seconds())
+
+
+@pytest.fixture
+def package():
+    return load_package()
+
+
+@pytest.fixture(autouse=True)
+def fake_reactor(package, monkeypatch):
+    fake = FakeReactor()
+    monkeypatch.setattr(package.wemo_devices, "reactor", fake)
+    return fake
+
+
+class FakeDiscovery(object):
+    def __init__(self):
+        self.discovered = []
+
+    def new(self, discover_id, device_data, **kwargs):
+        self.discovered.append(discover_id)
+
+
+@pytest.fixture
+def wemo(package):
+    """A Wemo module instance wired to fake gateway libraries and a real pywemo registry."""
+    module = package.wemo.Wemo()
+    module._module_starting = lambda: None
+    module._module_devices_cached = {}
+    module._DeviceTypes = {}
+    module._Devices = types.SimpleNamespace(device_commands={})
+    module._Discovery = FakeDiscovery()
+    module._init_()
+    module.subscription_registry = pywemo.SubscriptionRegistry()
+    return module
+
+
+@pytest.fixture
+def make_endpoint():
+    """Returns a factory for fake pywemo devices."""
+    return FakeEndpoint
+
+
+@pytest.fixture
+def attached_endpoint(wemo, package, fake_reactor):
+    """
+    Returns a factory that attaches a fake pywemo device to a fake Yombo device, the same way
+    a discovery scan does. The factory returns the wemo endpoint and the Yombo device.
+    """
+    def attach(endpoint, endpoint_class=None):
+        if endpoint_class is None:
+            endpoint_class = package.wemo_devices.Wemo_Endpoint_Switch
+        wemo.wemo_records[endpoint.serialnumber] = package.wemo_devices.Wemo_Record(endpoint, None)
+        wemo.announced_serials.add(endpoint.serialnumber)
+        wemo_device = endpoint_class(wemo, endpoint)
+        wemo.wemo_devices[endpoint.serialnumber] = wemo_device
+        wemo.subscribe_endpoint(wemo_device)
+        yombo_device = FakeYomboDevice(fake_reactor)
+        wemo_device.attach_yombo_device(yombo_device)
+        fake_reactor.flush()
+        return wemo_device, yombo_device
+    return attach
+
+
+@pytest.fixture
+def scan(wemo, package, monkeypatch):
+    """
+    Returns a function that runs a discovery scan which finds the given devices. The discovery
+    thread is run inline.
+    """
+    def run_scan(*devices):
+        monkeypatch.setattr(package.wemo.threads, "deferToThread",
+                            lambda func, *args, **kwargs: defer.succeed(list(devices)))
+        return wemo.discover_devices()
+    return run_scan
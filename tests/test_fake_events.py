@@ -0,0 +1,141 @@
+"""
+Feeds pywemo style events into Wemo.update_callback, the same way pywemo's HTTP thread does.
+"""
+import threading
+from html import escape
+
+import pytest
+
+
+def attribute_list(**attributes):
+    """Builds the escaped attributeList payload sent by a maker."""
+    xml = "".join("<attribute><name>%s</name><value>%s</value></attribute>" % (name, value)
+                  for name, value in attributes.items())
+    return escape(xml)
+
+
+@pytest.fixture
+def send(wemo, fake_reactor):
+    """
+    Returns a function that delivers an event from a separate thread, like pywemo's HTTP server
+    does, then lets the reactor run anything due now.
+    """
+    def send_event(endpoint, event_type, value):
+        thread = threading.Thread(target=wemo.update_callback, args=(endpoint, event_type, value),
+                                  name="Wemo HTTP Thread")
+        thread.start()
+        thread.join()
+        fake_reactor.advance(0)
+    return send_event
+
+
+@pytest.fixture
+def binary_sensor(package, attached_endpoint, make_endpoint):
+    return attached_endpoint(make_endpoint("M", model_name="Motion"),
+                             package.wemo_devices.Wemo_Endpoint_Binary_Sensor)
+
+
+@pytest.fixture
+def maker(package, attached_endpoint, make_endpoint):
+    return attached_endpoint(make_endpoint("K", model_name="Maker"), package.wemo_devices.Wemo_Endpoint_Maker)
+
+
+def test_motion_edges_are_deduplicated_and_timestamped(binary_sensor, send):
+    wemo_device, yombo_device = binary_sensor
+    assert [status['machine_status'] for status in yombo_device.statuses] == [0]
+
+    for value in ("1", "1", "0", "0", "1"):
+        send(wemo_device.endpoint, "BinaryState", value)
+
+    statuses = yombo_device.statuses[1:]
+    assert [status['machine_status'] for status in statuses] == [1, 0, 1]
+    assert [status['machine_status_extra']['edge'] for status in statuses] == ["rising", "falling", "rising"]
+    edge_times = [status['machine_status_extra']['edge_at'] for status in statuses]
+    assert edge_times == sorted(edge_times)
+    assert wemo_device.edge_count == 3
+
+
+def test_sensor_events_are_handed_to_the_reactor(binary_sensor, send, fake_reactor):
+    wemo_device, yombo_device = binary_sensor
+    del fake_reactor.handoffs[:]
+
+    send(wemo_device.endpoint, "BinaryState", "1")
+    assert fake_reactor.handoffs == ["Wemo HTTP Thread"]
+
+
+def test_sensor_dispatch_latency(binary_sensor, send, fake_reactor):
+    """Event to Yombo device latency, without the 100 ms delay used by the generic path."""
+    wemo_device, yombo_device = binary_sensor
+    latencies = []
+    for value in ("1", "0") * 50:
+        start = fake_reactor.seconds()
+        send(wemo_device.endpoint, "BinaryState", value)
+        assert fake_reactor.seconds() == start  # Applied without advancing the clock.
+        latencies.append(wemo_device.last_dispatch_latency)
+
+    assert yombo_device.delayed_calls == 0
+    assert len(yombo_device.statuses) == 101
+    assert max(latencies) < 0.1
+
+
+def test_binary_sensor_ignores_other_events(binary_sensor, send):
+    wemo_device, yombo_device = binary_sensor
+
+    send(wemo_device.endpoint, "attributeList", attribute_list(Sensor=1))
+    send(wemo_device.endpoint, "Brightness", "1")
+    send(wemo_device.endpoint, "SensorTimeout", "30")
+    assert len(yombo_device.statuses) == 1
+    assert wemo_device.edge_count == 0
+
+
+def test_maker_reports_sensor_and_relay_separately(maker, send, fake_reactor):
+    wemo_device, yombo_device = maker
+    endpoint = wemo_device.endpoint
+    assert wemo_device.sensor_state is None
+
+    # Raw sensor value 1 is not triggered.
+    send(endpoint, "attributeList", attribute_list(Switch=0, Sensor=1, SwitchMode=0, SensorPresent=1))
+    assert wemo_device.sensor_state == 0
+    assert wemo_device.last_sensor_edge is None
+
+    send(endpoint, "attributeList", attribute_list(Switch=0, Sensor=0, SwitchMode=0, SensorPresent=1))
+    extra = yombo_device.statuses[-1]['machine_status_extra']
+    assert 'machine_status' not in yombo_device.statuses[-1]
+    assert extra['sensor_state'] == 1
+    assert extra['sensor_edge'] == "rising"
+    assert extra['relay_state'] == 0
+
+    # The relay uses the generic path, applied after its 100 ms delay.
+    statuses = len(yombo_device.statuses)
+    send(endpoint, "BinaryState", "1")
+    assert len(yombo_device.statuses) == statuses
+    fake_reactor.advance(0.100)
+    status = yombo_device.statuses[-1]
+    assert status['machine_status'] == 1
+    assert status['machine_status_extra']['relay_state'] == 1
+    assert status['machine_status_extra']['sensor_state'] == 1
+
+    send(endpoint, "attributeList", attribute_list(Sensor=1))
+    extra = yombo_device.statuses[-1]['machine_status_extra']
+    assert extra['sensor_state'] == 0
+    assert extra['sensor_edge'] == "falling"
+    assert extra['relay_state'] == 1
+    assert wemo_device.sensor_edge_count == 2
+
+
+def test_maker_relay_ignores_other_events(maker, send, fake_reactor):
+    wemo_device, yombo_device = maker
+
+    send(wemo_device.endpoint, "SwitchMode", "1")
+    fake_reactor.flush()
+    assert len(yombo_device.statuses) == 1
+    assert wemo_device.relay_state == 0
+
+
+def test_maker_ignores_bad_attribute_list(maker, send):
+    wemo_device, yombo_device = maker
+
+    send(wemo_device.endpoint, "attributeList", "&lt;attribute&gt;")
+    send(wemo_device.endpoint, "attributeList", attribute_list(Switch=1))
+    assert len(yombo_device.statuses) == 1
+    assert wemo_device.sensor_state is None
@@ -0,0 +1,105 @@
+def pywemo_counts(wemo):
+    stats = wemo.registry_stats()
+    return stats['pywemo_devices'], stats['pywemo_callbacks'], stats['pywemo_scheduled']
+
+
+def test_unsubscribe_releases_pywemo_entries(wemo, attached_endpoint, make_endpoint):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+    assert pywemo_counts(wemo) == (1, 1, 1)
+
+    wemo.unsubscribe_endpoint(wemo_device)
+    registry = wemo.subscription_registry
+    assert registry._devices == {}
+    assert wemo_device.endpoint not in registry._callbacks
+    assert registry._events == {}
+    assert registry._sched.empty()
+
+
+def test_evict_vanished_detaches_and_releases(wemo, package, attached_endpoint, make_endpoint):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+    wemo.wemo_records["B"] = package.wemo_devices.Wemo_Record(make_endpoint("B", host="10.0.0.3"), None)
+    wemo.wemo_records["A"].last_seen -= wemo.vanished_ttl + 1
+
+    assert wemo.evict_vanished_devices() == ["A"]
+    assert yombo_device.wemo_device is None
+    stats = wemo.registry_stats()
+    assert stats['records'] == 1
+    assert stats['attached'] == 0
+    assert stats['evicted'] == 1
+    assert pywemo_counts(wemo) == (0, 0, 0)
+
+
+def test_evict_releases_device_rescheduled_by_reconnect(wemo, attached_endpoint, make_endpoint, scan):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+    endpoint = wemo_device.endpoint
+    registry = wemo.subscription_registry
+    wemo.wemo_records["A"].last_seen -= wemo.vanished_ttl + 1
+
+    # pywemo's reconnect_with_device replaces the device's attributes, changing its host.
+    endpoint.host = "10.0.0.9"
+    wemo.evict_vanished_devices()
+    # A resubscribe that was running during eviction schedules itself again.
+    with registry._event_thread_cond:
+        registry._events["A"] = registry._sched.enter(60, 0, registry._resubscribe, [endpoint])
+    assert pywemo_counts(wemo) == (0, 0, 1)
+
+    scan()
+    stats = wemo.registry_stats()
+    assert stats['records'] == 0
+    assert pywemo_counts(wemo) == (0, 0, 0)
+    assert registry._sched.empty()
+
+
+def test_moved_device_does_not_grow_registry(wemo, attached_endpoint, make_endpoint):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+    for host in ("10.0.0.4", "10.0.0.5", "10.0.0.6"):
+        wemo.unsubscribe_endpoint(wemo_device)
+        wemo_device.replace_endpoint(make_endpoint("A", host=host))
+        wemo.subscribe_endpoint(wemo_device)
+
+    assert pywemo_counts(wemo) == (1, 1, 1)
+    assert list(wemo.subscription_registry._devices) == ["10.0.0.6"]
+
+
+def test_events_keep_device_from_being_evicted(wemo, attached_endpoint, make_endpoint):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+    wemo.wemo_records["A"].last_seen -= wemo.vanished_ttl + 1
+
+    wemo.update_callback(wemo_device.endpoint, "BinaryState", "1")
+    assert wemo.evict_vanished_devices() == []
+    assert "A" in wemo.wemo_devices
+
+
+def test_short_vanished_ttl_uses_default(package, wemo):
+    wemo._module_variables_cached = {'vanished_ttl': {'values': ['0']}}
+    wemo._init_()
+    assert wemo.vanished_ttl == package.const.DEFAULT_VANISHED_TTL
+
+
+def test_returning_device_is_not_announced_again(wemo, make_endpoint, scan):
+    endpoint = make_endpoint("A")
+    scan(endpoint)
+    wemo.wemo_records["A"].last_seen -= wemo.vanished_ttl + 1
+    scan()
+    assert "A" not in wemo.wemo_records
+
+    scan(endpoint)
+    assert "A" in wemo.wemo_records
+    assert wemo._Discovery.discovered == ["wemo:A"]
+
+
+def test_failed_scan_allows_later_scans(wemo, attached_endpoint, make_endpoint, scan):
+    wemo_device, yombo_device = attached_endpoint(make_endpoint("A"))
+
+    def get_state():
+        raise OSError("unreachable")
+    moved = make_endpoint("A", host="10.0.0.7")
+    moved.get_state = get_state
+    result = scan(moved)
+    failures = []
+    result.addErrback(failures.append)
+    assert len(failures) == 1
+    assert wemo.scan_running is False
+
+    scan(make_endpoint("B", host="10.0.0.8"))
+    assert "B" in wemo.wemo_records
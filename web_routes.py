@@ -30,9 +30,11 @@ def module_wemo_routes(webapp):
         @webapp.route("/wemo/index", methods=['GET'])
         @require_auth()
         def page_tools_module_wemo_index_get(webinterface, request, session):
+            wemo = webinterface._Modules['Wemo']
             page = webinterface.webapp.templates.get_template('modules/wemo/web/index.html')
             root_breadcrumb(webinterface, request)
             return page.render(alerts=webinterface.get_alerts(),
+                               registry_stats=wemo.registry_stats(),
                                )
 
         @webapp.route("/wemo/discover", methods=['GET'])
@@ -23,7 +23,9 @@ more details.
 :license: Apache 2.0
 """
 # Import python libraries
+from time import time
 import pywemo
+import requests
 
 # Import twisted libraries
 from twisted.internet import threads
@@ -38,7 +40,8 @@ from yombo.core.module import YomboModule
 from yombo.utils import random_int
 
 from . import const as wconst
-from .wemo_devices import Wemo_Endpoint_Binary_Sensor, Wemo_Endpoint_Light, Wemo_Endpoint_Switch
+from .wemo_devices import (Wemo_Record, Wemo_Endpoint_Binary_Sensor, Wemo_Endpoint_Light, Wemo_Endpoint_Maker,
+    Wemo_Endpoint_Switch)
 from .web_routes import module_wemo_routes
 
 logger = get_logger("modules.wemo")
@@ -55,6 +58,17 @@ WEMO_PLATFORMS = {
     'Socket':  PLATFORM_SWITCH
 }
 
+WEMO_ENDPOINTS = {
+    PLATFORM_BINARY_SENSOR: Wemo_Endpoint_Binary_Sensor,
+    PLATFORM_LIGHT: Wemo_Endpoint_Light,
+    PLATFORM_SWITCH: Wemo_Endpoint_Switch,
+}
+
+# Models that need more than the generic endpoint for their platform.
+WEMO_MODEL_ENDPOINTS = {
+    'Maker': Wemo_Endpoint_Maker,
+}
+
 
 class Wemo(YomboModule):
     """
@@ -70,8 +84,21 @@ class Wemo(YomboModule):
         self._module_starting()
         self.scan_running = False
         self.yombo_devices = self._module_devices_cached
-        self.wemo_devices = {}
+        self.wemo_devices = {}  # Endpoints attached to a Yombo device, these hold a pywemo device and subscription.
+        self.wemo_records = {}  # Lightweight records of every wemo device seen on the network.
+        self.announced_serials = set()  # Serial numbers already sent to the discovery library.
         self.subscription_registry = None
+        self.evicted_count = 0
+        self.reattached_count = 0
+        try:
+            self.vanished_ttl = int(
+                self._module_variables_cached[wconst.MODULE_VARIABLE_VANISHED_TTL]['values'][0])
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+            self.vanished_ttl = wconst.DEFAULT_VANISHED_TTL
+        if self.vanished_ttl < wconst.MINIMUM_VANISHED_TTL:
+            logger.warn("Wemo vanished_ttl of {ttl} is shorter than the discovery interval, using {default}.",
+                        ttl=self.vanished_ttl, default=wconst.DEFAULT_VANISHED_TTL)
+            self.vanished_ttl = wconst.DEFAULT_VANISHED_TTL
 
     @inlineCallbacks
     def _load_(self, **kwargs):
@@ -86,7 +113,8 @@ class Wemo(YomboModule):
         self.subscription_registry.start()
 
         self.discover_devices_loop = LoopingCall(self.discover_devices)
-        self.discover_devices_loop.start(random_int(3600, .20), False)
+        self.discover_devices_loop.start(
+            random_int(wconst.DISCOVERY_INTERVAL, wconst.DISCOVERY_INTERVAL_JITTER), False)
 
     def _stop_(self, **kwargs):
         self.subscription_registry.stop()
@@ -129,51 +157,217 @@ class Wemo(YomboModule):
             return
         self.scan_running = True
 
-        devices = yield threads.deferToThread(self._do_discover_devices)
-        for device in devices:
-            if device.serialnumber not in self.wemo_devices:
-                platform = WEMO_PLATFORMS[device.model_name]
-                if platform == PLATFORM_BINARY_SENSOR:
-                    self.wemo_devices[device.serialnumber] = Wemo_Endpoint_Binary_Sensor(self, device)
-                elif platform == PLATFORM_LIGHT:
-                    self.wemo_devices[device.serialnumber] = Wemo_Endpoint_Light(self, device)
-                elif platform == PLATFORM_SWITCH:
-                    self.wemo_devices[device.serialnumber] = Wemo_Endpoint_Switch(self, device)
-
-                try:
-                    yombo_device = self.find_yombo_device(device.serialnumber)
-                except KeyError as e:
-                    yombo_device = None
-
-                if yombo_device is not None:
-                    self.subscription_registry.register(self.wemo_devices[device.serialnumber].endpoint)
-                    self.subscription_registry.on(self.wemo_devices[device.serialnumber].endpoint, None, self.update_callback)
-                    self.wemo_devices[device.serialnumber].attach_yombo_device(yombo_device)
-
-                self._Discovery.new(
-                    discover_id="wemo:%s" % device.serialnumber,
-                    device_data={
-                        'source': wconst.DISCOVERY_SOURCE,
-                        'discover_id': "wemo:%s" % device.serialnumber,
-                        'description': 'Wemo %s' % device.model_name,
-                        'mfr': "wemo",
-                        'model': device.model_name,
-                        'serial': device.serialnumber,
-                        'label': '',
-                        'machine_label': '',
-                        'device_type': self.wemo_devices[device.serialnumber].device_type,
-                        'variables': {
-                            'serialnumber': str(device.serialnumber),
-                        },
-                    'yombo_device': yombo_device
-                    }, **{
-                        'notification_title': 'New Wemo device found',
-                        'notification_message': 'The Wemo module found a new Wemo device. <p>Type: %s<br>' %
-                            device.model_name,
-                    }
-                )
+        try:
+            devices = yield threads.deferToThread(self._do_discover_devices)
+            seen_at = time()
+            for device in devices:
+                serialnumber = device.serialnumber
+                endpoint_class = WEMO_MODEL_ENDPOINTS.get(device.model_name,
+                                                          WEMO_ENDPOINTS[WEMO_PLATFORMS[device.model_name]])
+
+                if serialnumber not in self.wemo_records:
+                    record = Wemo_Record(device, self._DeviceTypes.get(endpoint_class.DEVICE_TYPE), seen_at)
+                    self.wemo_records[serialnumber] = record
+                    moved = False
+                else:
+                    record = self.wemo_records[serialnumber]
+                    moved = record.seen(device, seen_at)
+
+                yombo_device = None
+                if serialnumber in self.wemo_devices:
+                    if moved:
+                        logger.info("Wemo device {serial} moved to {host}:{port}, reattaching.",
+                                    serial=serialnumber, host=device.host, port=device.port)
+                        self.unsubscribe_endpoint(self.wemo_devices[serialnumber])
+                        self.wemo_devices[serialnumber].replace_endpoint(device)
+                        self.subscribe_endpoint(self.wemo_devices[serialnumber])
+                        self.reattached_count += 1
+                else:
+                    try:
+                        yombo_device = self.find_yombo_device(serialnumber)
+                    except KeyError as e:
+                        yombo_device = None
+
+                    if yombo_device is not None:
+                        self.wemo_devices[serialnumber] = endpoint_class(self, device)
+                        self.subscribe_endpoint(self.wemo_devices[serialnumber])
+                        self.wemo_devices[serialnumber].attach_yombo_device(yombo_device)
+
+                if serialnumber not in self.announced_serials:
+                    self.announced_serials.add(serialnumber)
+                    self._Discovery.new(
+                        discover_id="wemo:%s" % serialnumber,
+                        device_data={
+                            'source': wconst.DISCOVERY_SOURCE,
+                            'discover_id': "wemo:%s" % serialnumber,
+                            'description': 'Wemo %s' % device.model_name,
+                            'mfr': "wemo",
+                            'model': device.model_name,
+                            'serial': serialnumber,
+                            'label': '',
+                            'machine_label': '',
+                            'device_type': record.device_type,
+                            'variables': {
+                                'serialnumber': str(serialnumber),
+                            },
+                        'yombo_device': yombo_device
+                        }, **{
+                            'notification_title': 'New Wemo device found',
+                            'notification_message': 'The Wemo module found a new Wemo device. <p>Type: %s<br>' %
+                                device.model_name,
+                        }
+                    )
+
+            self.evict_vanished_devices(seen_at)
+            self.prune_subscription_registry()
+            logger.debug("Wemo registry after scan: {stats}", stats=self.registry_stats())
+        finally:
+            self.scan_running = False
+
+    def subscribe_endpoint(self, wemo_device):
+        """
+        Register a wemo endpoint with the pywemo subscription registry to receive state updates.
+
+        :param wemo_device: A Wemo_Endpoint instance.
+        :return:
+        """
+        with self.subscription_registry._event_thread_cond:
+            self._cancel_resubscribe(wemo_device.endpoint.serialnumber)
+        self.subscription_registry.register(wemo_device.endpoint)
+        self.subscription_registry.on(wemo_device.endpoint, None, self.update_callback)
 
-        self.scan_running = False
+    def unsubscribe_endpoint(self, wemo_device):
+        """
+        Remove a wemo endpoint from the pywemo subscription registry.
+
+        pywemo 0.4.28 doesn't provide a way to unregister a device, so the registry's
+        device, callback and resubscribe entries are removed here. An UNSUBSCRIBE is then
+        sent to the device in a thread.
+
+        :param wemo_device: A Wemo_Endpoint instance.
+        :return:
+        """
+        registry = self.subscription_registry
+        endpoint = wemo_device.endpoint
+        with registry._event_thread_cond:
+            sid = self._cancel_resubscribe(endpoint.serialnumber)
+            # pywemo may have changed the endpoint's host while reconnecting, so match by identity.
+            for host, device in list(registry._devices.items()):
+                if device is endpoint:
+                    del registry._devices[host]
+            registry._callbacks.pop(endpoint, None)
+
+        if sid is None:
+            return
+        d = threads.deferToThread(self._do_unsubscribe, endpoint.basicevent.eventSubURL, sid)
+        d.addErrback(lambda failure: logger.warn("Unable to send unsubscribe to wemo device {serial}: {e}",
+                                                 serial=endpoint.serialnumber, e=failure.getErrorMessage()))
+
+    def _cancel_resubscribe(self, serialnumber):
+        """
+        Cancel the pywemo resubscribe event for a device. The caller must hold the registry's
+        _event_thread_cond. A resubscribe that is already running can still schedule a new
+        event, prune_subscription_registry cancels those after each scan.
+
+        :param serialnumber:
+        :return: The subscription ID, if the device was subscribed.
+        """
+        registry = self.subscription_registry
+        event = registry._events.pop(serialnumber, None)
+        if event is None:
+            return None
+        try:
+            registry._sched.cancel(event)
+        except ValueError:
+            pass  # The event is running or has already run.
+        if len(event.argument) > 1:
+            return event.argument[1]
+        return None
+
+    def prune_subscription_registry(self):
+        """
+        Remove anything left in the pywemo subscription registry for devices that are no longer
+        attached. A resubscribe that was running during eviction, such as one stuck in
+        reconnect_with_device for a vanished device, schedules itself again afterwards.
+
+        :return:
+        """
+        registry = self.subscription_registry
+        with registry._event_thread_cond:
+            for serialnumber in list(registry._events):
+                if serialnumber not in self.wemo_devices:
+                    self._cancel_resubscribe(serialnumber)
+            endpoints = [wemo_device.endpoint for wemo_device in self.wemo_devices.values()]
+            for host, device in list(registry._devices.items()):
+                if not any(device is endpoint for endpoint in endpoints):
+                    del registry._devices[host]
+            for device in list(registry._callbacks):
+                if not any(device is endpoint for endpoint in endpoints):
+                    del registry._callbacks[device]
+
+    def _do_unsubscribe(self, url, sid):
+        """
+        Send an UNSUBSCRIBE request to a wemo device.
+        This is a blocking function.
+
+        :param url: The event subscription URL.
+        :param sid: The subscription ID.
+        :return:
+        """
+        requests.request(method="UNSUBSCRIBE", url=url, headers={'SID': sid}, timeout=10)
+
+    def evict_vanished_devices(self, now=None):
+        """
+        Remove any wemo devices that haven't been seen within the vanished TTL. Attached
+        endpoints are unsubscribed and detached from their Yombo device. If the device
+        returns, the next discovery scan will reattach it.
+
+        :param now: Time to compare against, defaults to now.
+        :return: List of serial numbers evicted.
+        """
+        if now is None:
+            now = time()
+        evicted = []
+        for serialnumber, record in list(self.wemo_records.items()):
+            if now - record.last_seen < self.vanished_ttl:
+                continue
+            logger.info("Evicting wemo device {serial}, not seen for {seconds} seconds.",
+                        serial=serialnumber, seconds=int(now - record.last_seen))
+            if serialnumber in self.wemo_devices:
+                wemo_device = self.wemo_devices.pop(serialnumber)
+                self.unsubscribe_endpoint(wemo_device)
+                wemo_device.detach_yombo_device()
+            del self.wemo_records[serialnumber]
+            evicted.append(serialnumber)
+        self.evicted_count += len(evicted)
+        return evicted
+
+    def registry_stats(self):
+        """
+        Returns counts about the wemo device registry, including what's held by the pywemo
+        subscription registry. These should remain flat over time unless devices are being
+        added to the network.
+
+        :return: A dictionary of registry counts.
+        """
+        stats = {
+            'records': len(self.wemo_records),
+            'attached': len(self.wemo_devices),
+            'unattached': len(self.wemo_records) - len(self.wemo_devices),
+            'evicted': self.evicted_count,
+            'reattached': self.reattached_count,
+            'vanished_ttl': self.vanished_ttl,
+            'pywemo_devices': 0,
+            'pywemo_callbacks': 0,
+            'pywemo_scheduled': 0,
+        }
+        registry = self.subscription_registry
+        if registry is not None:
+            with registry._event_thread_cond:
+                stats['pywemo_devices'] = len(registry._devices)
+                stats['pywemo_callbacks'] = sum(len(callbacks) for callbacks in registry._callbacks.values())
+                stats['pywemo_scheduled'] = len(registry._sched.queue)
+        return stats
 
     def _do_discover_devices(self):
         """
@@ -193,8 +387,10 @@ class Wemo(YomboModule):
         :param value:
         :return:
         """
+        if device.serialnumber in self.wemo_records:
+            self.wemo_records[device.serialnumber].last_seen = time()
         if device.serialnumber in self.wemo_devices:
-            self.wemo_devices[device.serialnumber].update_value(value)
+            self.wemo_devices[device.serialnumber].update_value(value, event_type=device_type)
 
     def _device_command_(self, **kwargs):
         """
@@ -208,7 +404,7 @@ class Wemo(YomboModule):
             return  # not meant for us.
         request_id = kwargs[COMMAND_COMPONENT_REQUEST_ID]
 
-        if hasattr(device, 'wemo_device') is False:
+        if getattr(device, 'wemo_device', None) is None:
             logger.warn("Unable to control device: {label}, wemo is missing from device.", label=device.full_label)
             return
 
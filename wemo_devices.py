@@ -1,5 +1,8 @@
+from html import unescape
 from time import time
+from xml.etree import ElementTree
 
+from twisted.internet import reactor
 
 from yombo.constants.commands import COMMAND_COMPONENT_INPUTS, COMMAND_COMPONENT_REQUEST_ID
 from yombo.constants.features import FEATURE_BRIGHTNESS, FEATURE_PERCENT, FEATURE_NUMBER_OF_STEPS
@@ -7,14 +10,60 @@ from yombo.constants.inputs import INPUT_BRIGHTNESS, INPUT_PERCENT
 from yombo.constants.status_extra import STATUS_EXTRA_BRIGHTNESS
 from yombo.core.log import get_logger
 
+from . import const as wconst
+
 logger = get_logger("modules.wemo.devices")
 
 
+class Wemo_Record(object):
+    """
+    A lightweight record of a discovered wemo device. This is kept for every device found on the
+    network, even if it's not attached to a Yombo device. It does not hold a pywemo device, so it
+    doesn't consume a subscription slot.
+    """
+    __slots__ = ('serialnumber', 'model_name', 'device_type', 'host', 'port', 'first_seen', 'last_seen')
+
+    def __init__(self, endpoint, device_type, seen_at=None):
+        """
+        Create a new record from a freshly discovered pywemo device.
+
+        :param endpoint: The pywemo device.
+        :param device_type: Yombo device type for the device.
+        :param seen_at: Time the device was found, defaults to now.
+        """
+        if seen_at is None:
+            seen_at = time()
+        self.serialnumber = endpoint.serialnumber
+        self.model_name = endpoint.model_name
+        self.device_type = device_type
+        self.host = endpoint.host
+        self.port = endpoint.port
+        self.first_seen = seen_at
+        self.last_seen = seen_at
+
+    def seen(self, endpoint, seen_at=None):
+        """
+        Mark the record as seen during a discovery scan.
+
+        :param endpoint: The pywemo device.
+        :param seen_at: Time the device was found, defaults to now.
+        :return: True if the device moved to a new host or port.
+        """
+        if seen_at is None:
+            seen_at = time()
+        self.last_seen = seen_at
+        moved = self.host != endpoint.host or self.port != endpoint.port
+        self.host = endpoint.host
+        self.port = endpoint.port
+        return moved
+
+
 class Wemo_Endpoint(object):
     """
     This is a skeleton class represents a wemo device (a switch, light, sensor, etc)
     """
     FRIENDLY_LABEL = "Wemo device"
+    DEVICE_TYPE = "wemo_switch"
 
     def __init__(self, parent, endpoint):
         """
@@ -25,12 +74,13 @@ class Wemo_Endpoint(object):
         """
         self._Parent = parent
         self.endpoint = endpoint
-        self.device_type = self._Parent._DeviceTypes.get('wemo_switch')
+        self.device_type = self._Parent._DeviceTypes.get(self.DEVICE_TYPE)
         self.device_commands = parent._Devices.device_commands
         self.yombo_device = None
         self.state = self.endpoint.get_state()
         self.commands = {}
         self.last_request_id = None
+        self.last_dispatch_latency = None  # Seconds from event arrival to the Yombo device update.
         self.device_mfg = "wemo"
         self.FEATURES: dict = {}
 
@@ -47,11 +97,38 @@ class Wemo_Endpoint(object):
         self.FEATURES = self.yombo_device.FEATURES
         self.update_value(self.state)
 
-    def update_value(self, value):
+    def detach_yombo_device(self):
+        """
+        Detach the yombo device. Called when the wemo device is evicted, the Yombo device will
+        no longer point to this endpoint.
+
+        :return:
+        """
+        if self.yombo_device is None:
+            return
+        logger.info("Detach yombo device from me.. {label}", label=self.yombo_device.full_label)
+        if self.yombo_device.wemo_device is self:
+            self.yombo_device.wemo_device = None
+        self.yombo_device = None
+
+    def replace_endpoint(self, endpoint):
+        """
+        Swap in a new pywemo device, used when a device is found at a new address.
+
+        :param endpoint:
+        :return:
+        """
+        self.endpoint = endpoint
+        self.state = self.endpoint.get_state()
+        if self.yombo_device is not None:
+            self.update_value(self.state)
+
+    def update_value(self, value, event_type=None):
         """
         Called when the device state changes.
 
         :param value:
+        :param event_type: The pywemo event type, such as BinaryState.
         :return:
         """
         try:
@@ -94,15 +171,20 @@ class Wemo_Endpoint(object):
             status_extra[STATUS_EXTRA_BRIGHTNESS] = value
         self.set_status(status, status_extra, last_device_command=last_device_command)
 
-    def set_status(self, status, status_extra, last_command=None, last_device_command=None, delay=None):
+    def set_status(self, status, status_extra, last_command=None, last_device_command=None, delay=None,
+                   received_at=None):
         """
         Sets the status of related Yombo device.
 
+        pywemo calls update_value from its HTTP thread, so the update is always handed to the
+        reactor thread. A delay of 0 sets the status on the next reactor iteration.
+
         :param status:
         :param status_extra:
         :param last_command:
         :param last_device_command:
         :param delay:
+        :param received_at: Time the event arrived, used to measure the dispatch latency.
         :return:
         """
         if delay is None:
@@ -119,21 +201,48 @@ class Wemo_Endpoint(object):
             command = last_command
 
         if status is None:
-            self.yombo_device.set_status_delayed(
-                delay=delay,
-                machine_status_extra=status_extra,
-                request_id=request_id,
-                reported_by="Wemo node"
-            )
+            kwargs = {
+                'machine_status_extra': status_extra,
+                'request_id': request_id,
+                'reported_by': "Wemo node",
+            }
+        else:
+            kwargs = {
+                'command': command,
+                'request_id': request_id,
+                'machine_status': status,
+                'machine_status_extra': status_extra,
+                'reported_by': "Wemo node",
+            }
+
+        if delay == 0:
+            reactor.callFromThread(self._set_status_now, received_at, **kwargs)
         else:
-            self.yombo_device.set_status_delayed(
-                delay=delay,
-                command=command,
-                request_id=request_id,
-                machine_status=status,
-                machine_status_extra=status_extra,
-                reported_by="Wemo node"
-            )
+            reactor.callFromThread(self.yombo_device.set_status_delayed, delay=delay, **kwargs)
+
+    def _set_status_now(self, received_at, **kwargs):
+        """
+        Sets the status of the Yombo device, must be called in the reactor thread.
+
+        :param received_at: Time the event arrived.
+        :param kwargs: Passed to the Yombo device's set_status.
+        :return:
+        """
+        if self.yombo_device is None:  # Detached while waiting for the reactor.
+            return
+        self.yombo_device.set_status(**kwargs)
+        if received_at is not None:
+            self.last_dispatch_latency = time() - received_at
+
+    def event_details(self):
+        """
+        Event details shown in the Yombo device's debug data.
+
+        :return: A dictionary of names and values.
+        """
+        return {
+            'last_dispatch_latency': self.last_dispatch_latency,
+        }
 
     def turn_on(self, **kwargs):
         self.last_request_id = kwargs[COMMAND_COMPONENT_REQUEST_ID]
@@ -170,19 +279,92 @@ class Wemo_Endpoint(object):
 
 
 class Wemo_Endpoint_Binary_Sensor(Wemo_Endpoint):
-    """Representation of a wemo switch."""
+    """
+    Representation of a wemo binary sensor, such as a motion sensor.
 
-    FRIENDLY_LABEL = "Wemo switch"
+    Sensor events bypass the generic update path: each edge is timestamped when it arrives and
+    sent to the Yombo device, along with the edge, without a delay. Repeated events with the same
+    state are dropped.
+    """
+
+    FRIENDLY_LABEL = "Wemo binary sensor"
+    DEVICE_TYPE = "wemo_binary_sensor"
 
     def __init__(self, parent, endpoint):
         """Initialize the wemo binary sensor device."""
         Wemo_Endpoint.__init__(self, parent, endpoint)
-        self.device_type = self._Parent._DeviceTypes.get('wemo_binary_sensor')
         self.FEATURES.update({
             FEATURE_BRIGHTNESS: False,
             FEATURE_PERCENT: False,
             FEATURE_NUMBER_OF_STEPS: False
         })
+        self.binary_state = None  # Last state sent to the Yombo device, None until the first update.
+        self.last_edge = None
+        self.last_edge_at = None
+        self.edge_count = 0
+
+    def update_value(self, value, event_type=None):
+        """
+        Called when the sensor state changes, usually from the pywemo HTTP thread.
+
+        :param value:
+        :param event_type: The pywemo event type, such as BinaryState.
+        :return:
+        """
+        received_at = time()
+        if event_type not in (None, wconst.EVENT_BINARY_STATE):
+            return
+        try:
+            status = 1 if int(value) >= 1 else 0
+        except (TypeError, ValueError):
+            logger.debug("Wemo binary sensor ignoring value: {value}", value=value)
+            return
+
+        if self.yombo_device is None:
+            logger.info("Cannot update device state, no attached Yombo device.")
+            return
+
+        if status == self.binary_state:
+            return
+
+        if self.binary_state is not None:
+            self.record_edge(status, received_at)
+        self.binary_state = status
+        self.state = status
+        self.endpoint.state = status
+        self.set_status(status, {
+            wconst.STATUS_EXTRA_EDGE: self.last_edge,
+            wconst.STATUS_EXTRA_EDGE_AT: self.last_edge_at,
+        }, delay=0, received_at=received_at)
+
+    def record_edge(self, status, received_at):
+        """
+        Timestamp a rising or falling edge.
+
+        :param status: The new state, 1 or 0.
+        :param received_at: Time the event arrived.
+        :return:
+        """
+        self.edge_count += 1
+        self.last_edge_at = received_at
+        if status == 1:
+            self.last_edge = wconst.EDGE_RISING
+        else:
+            self.last_edge = wconst.EDGE_FALLING
+
+    def event_details(self):
+        """
+        Event details shown in the Yombo device's debug data.
+
+        :return: A dictionary of names and values.
+        """
+        details = Wemo_Endpoint.event_details(self)
+        details.update({
+            wconst.STATUS_EXTRA_EDGE: self.last_edge,
+            wconst.STATUS_EXTRA_EDGE_AT: self.last_edge_at,
+            'edge_count': self.edge_count,
+        })
+        return details
 
     def turn_on(self, **kwargs):
         pass
@@ -198,11 +380,11 @@ class Wemo_Endpoint_Light(Wemo_Endpoint):
     """Representation of a wemo light."""
 
     FRIENDLY_LABEL = "Wemo light"
+    DEVICE_TYPE = "wemo_light"
 
     def __init__(self, parent, endpoint):
         """Initialize the wemo switch device."""
         Wemo_Endpoint.__init__(self, parent, endpoint)
-        self.device_type = self._Parent._DeviceTypes.get('wemo_light')
         self.FEATURES.update({
             FEATURE_BRIGHTNESS: True,
             FEATURE_PERCENT: True,
@@ -222,13 +404,124 @@ class Wemo_Endpoint_Switch(Wemo_Endpoint):
     """Representation of a wemo switch."""
 
     FRIENDLY_LABEL = "Wemo switch"
+    DEVICE_TYPE = "wemo_switch"
 
     def __init__(self, parent, endpoint):
         """Initialize the wemo switch device."""
         Wemo_Endpoint.__init__(self, parent, endpoint)
-        self.device_type = self._Parent._DeviceTypes.get('wemo_switch')
         self.FEATURES.update({
             FEATURE_BRIGHTNESS: False,
             FEATURE_PERCENT: False,
             FEATURE_NUMBER_OF_STEPS: False
         })
+
+
+class Wemo_Endpoint_Maker(Wemo_Endpoint_Switch):
+    """
+    Representation of a wemo maker. The relay is handled like any other switch, the sensor
+    input is tracked separately and its edges are sent without a delay. Both are included in
+    every status extra, so neither update overwrites the other.
+
+    The maker reports its sensor as 0 when triggered, this is inverted so sensor_state is 1 when
+    triggered. A rising edge means the sensor was triggered, a falling edge means it was released.
+    """
+
+    FRIENDLY_LABEL = "Wemo maker"
+    DEVICE_TYPE = "wemo_switch"
+
+    def __init__(self, parent, endpoint):
+        """Initialize the wemo maker device."""
+        Wemo_Endpoint_Switch.__init__(self, parent, endpoint)
+        self.relay_state = self.state
+        self.sensor_state = None  # Unknown until the first attributeList event.
+        self.last_sensor_edge = None
+        self.last_sensor_edge_at = None
+        self.sensor_edge_count = 0
+
+    def update_value(self, value, event_type=None):
+        """
+        Called when the maker relay or sensor changes.
+
+        :param value:
+        :param event_type: The pywemo event type, such as BinaryState.
+        :return:
+        """
+        if event_type == wconst.EVENT_ATTRIBUTE_LIST:
+            return self.update_sensor(value)
+        if event_type not in (None, wconst.EVENT_BINARY_STATE):
+            return
+        Wemo_Endpoint_Switch.update_value(self, value, event_type)
+
+    def update_status(self, value, last_device_command):
+        """
+        Update the relay status, the sensor state is sent along with it.
+
+        :param value:
+        :param last_device_command:
+        :return:
+        """
+        self.endpoint.state = value
+        if value >= 1:
+            status = 1
+        else:
+            status = 0
+        self.relay_state = status
+        self.set_status(status, self.status_extra(), last_device_command=last_device_command)
+
+    def update_sensor(self, value):
+        """
+        Handle an attributeList event, which carries the sensor state.
+
+        :param value: The escaped attribute list XML from the device.
+        :return:
+        """
+        received_at = time()
+        try:
+            attributes = ElementTree.fromstring("<attributes>%s</attributes>" % unescape(value))
+        except (ElementTree.ParseError, TypeError) as e:
+            logger.debug("Wemo maker unable to parse attribute list: {e}", e=e)
+            return
+
+        sensor_state = None
+        for attribute in attributes.findall("attribute"):
+            if attribute.findtext("name") == "Sensor":
+                try:
+                    sensor_state = 0 if int(attribute.findtext("value")) else 1
+                except (TypeError, ValueError):
+                    pass
+        if sensor_state is None or sensor_state == self.sensor_state:
+            return
+
+        if self.sensor_state is not None:
+            self.sensor_edge_count += 1
+            self.last_sensor_edge_at = received_at
+            self.last_sensor_edge = wconst.EDGE_RISING if sensor_state == 1 else wconst.EDGE_FALLING
+        self.sensor_state = sensor_state
+
+        if self.yombo_device is None:
+            return
+        self.set_status(None, self.status_extra(), delay=0, received_at=received_at)
+
+    def status_extra(self):
+        """
+        Status extra for the maker, includes both the relay and sensor.
+
+        :return:
+        """
+        return {
+            wconst.STATUS_EXTRA_RELAY_STATE: self.relay_state,
+            wconst.STATUS_EXTRA_SENSOR_STATE: self.sensor_state,
+            wconst.STATUS_EXTRA_SENSOR_EDGE: self.last_sensor_edge,
+            wconst.STATUS_EXTRA_SENSOR_EDGE_AT: self.last_sensor_edge_at,
+        }
+
+    def event_details(self):
+        """
+        Event details shown in the Yombo device's debug data.
+
+        :return: A dictionary of names and values.
+        """
+        details = Wemo_Endpoint_Switch.event_details(self)
+        details.update(self.status_extra())
+        details['sensor_edge_count'] = self.sensor_edge_count
+        return details